@@ -1,8 +1,8 @@
 import os
 import json
 import logging
-import requests
-import time
+import asyncio
+import httpx
 from huggingface_hub import hf_hub_download, snapshot_download
 
 #set where to send registration request
@@ -20,7 +20,7 @@ CAPABILITY_PRICE_SCALING = os.environ.get("CAPABILITY_PRICE_SCALING", 1)
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
-def register_to_orchestrator():
+async def register_to_orchestrator():
     register_req = {
         "url": CAPABILITY_URL,
         "name": CAPABILITY_NAME,
@@ -33,27 +33,30 @@ def register_to_orchestrator():
         "Authorization": ORCH_SECRET,
         "Content-Type": "application/json",
     }
-    #do the registration
+    #do the registration, retries back off exponentially up to max_delay
     max_retries = 10
     delay = 2  # seconds
+    max_delay = 30  # seconds
     logger.info("registering: "+json.dumps(register_req))
-    for attempt in range(1, max_retries + 1):
-        try:
-            response = requests.post(ORCH_URL+"/capability/register", json=register_req, headers=headers, timeout=5, verify=False)  # You can change to POST or other method
-            if response.status_code == 200:
-                logger.info("Capability registered")
-                return True
-            elif response.status_code == 400:
-                logger.error("orch secret incorrect")
-                return False
-            else:
+    async with httpx.AsyncClient(verify=False, timeout=5) as client:
+        for attempt in range(1, max_retries + 1):
+            try:
+                response = await client.post(ORCH_URL+"/capability/register", json=register_req, headers=headers)
+                if response.status_code == 200:
+                    logger.info("Capability registered")
+                    return True
+                elif response.status_code == 400:
+                    logger.error("orch secret incorrect")
+                    return False
+                else:
+                    logger.info(f"Attempt {attempt} failed: status code {response.status_code}")
+            except httpx.HTTPError as e:
                 logger.info(f"Attempt {attempt} failed: {e}")
-        except requests.RequestException as e:
-            if attempt == max_retries:
-                logger.error("All retries failed.")
-            else:
-                time.sleep(delay)
+            
+            if attempt < max_retries:
+                await asyncio.sleep(min(delay * 2 ** (attempt - 1), max_delay))
     #not successful, return false
+    logger.error("All retries failed.")
     return False
 
 
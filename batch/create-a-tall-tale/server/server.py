@@ -37,10 +37,10 @@ logger.propagate = False
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Create application wide hardware info service.
-    if not register_to_orchestrator():
-        logger.error("failed to register to orchestrator, exiting")
+    # Register in the background so startup is not blocked waiting on the orchestrator
+    app.register_task = asyncio.create_task(register())
     
+    # Create application wide hardware info service.
     app.hardware_info = HardwareInfo()
     
     try:
@@ -56,9 +56,17 @@ async def lifespan(app: FastAPI):
         logger.error("pipeline overrides file is not valid json, exiting")
         return
     
+    #shared client keeps connections to the vllm worker alive across requests
+    app.http_client = httpx.AsyncClient(timeout=None, limits=httpx.Limits(max_keepalive_connections=10))
+    
     yield
     
     logger.info("Shutting down")
+    await app.http_client.aclose()
+
+async def register():
+    if not await register_to_orchestrator():
+        logger.error("failed to register to orchestrator")
 
 app = FastAPI(lifespan=lifespan)
 
@@ -100,8 +108,6 @@ async def create_story(request: Request):
                 if line.strip():  # Only forward non-empty lines
                     yield f"{line}\n"
                     await asyncio.sleep(0)  # Yield control to event loop
-                        
-    client = httpx.AsyncClient(timeout=None)
     
-    return StreamingResponse(event_generator(client), media_type="text/event-stream")
+    return StreamingResponse(event_generator(request.app.http_client), media_type="text/event-stream")
 
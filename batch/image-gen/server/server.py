@@ -1,20 +1,25 @@
-import os, io, sys, time, logging, json, random, base64, importlib, inspect
+import os, io, sys, time, logging, json, random, base64, importlib, inspect, copy, hashlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
+from functools import lru_cache
 
 import requests
 import torch
+import torchvision
 import asyncio
-import numpy as np
+import orjson
 
 from fastapi import FastAPI, Request, HTTPException, Response
+from fastapi.responses import ORJSONResponse
 
 from server.register import *
 from server.hardware import HardwareInfo
+from server.cuda_graph import CUDAGraphTransformer
 
 from diffusers import DiffusionPipeline
 from transformers import T5TokenizerFast, T5ForConditionalGeneration
 from torchao.quantization import autoquant
-from PIL import Image
 
 # Get the logger instance
 logger = logging.getLogger(__name__)
@@ -28,7 +33,12 @@ logger.propagate = False
 
 pipeline_overrides = {}
 
-img_buf = io.BytesIO() 
+#output image format, JPEG or PNG
+img_format = os.environ.get("IMG_FORMAT", "JPEG").upper()
+if img_format not in ("JPEG", "PNG"):
+    logger.error(f"IMG_FORMAT {img_format} is not supported, must be JPEG or PNG. using JPEG")
+    img_format = "JPEG"
+img_media_type = "image/png" if img_format == "PNG" else "image/jpeg"
 
 #pulled from diffusers __call__
 sys_instruction =  [
@@ -42,20 +52,24 @@ sys_instruction =  [
             "User Prompt: ",
         ]
 
-generated_prompt_embeds = {}
+llm_instruction = "Expand the following prompt to add more detail:"
+
+#size of the LRU cache of prompt embeds kept in app state
+max_prompt_embeds = int(os.environ.get("PROMPT_EMBEDS_CACHE_SIZE", "512"))
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Create application wide hardware info service.
-    if not register_to_orchestrator():
-        logger.error("failed to register to orchestrator, exiting")
+    # Register in the background so startup is not blocked waiting on the orchestrator
+    app.register_task = asyncio.create_task(register())
     
     try:
-        check_models_exist()
+        #download off the event loop so registration proceeds while models are fetched
+        await asyncio.to_thread(check_models_exist)
     except:
         logger.error("failed to locate MODEL_ID, exiting")
         return
     
+    # Create application wide hardware info service.
     app.hardware_info = HardwareInfo()
     
     try:
@@ -73,17 +87,35 @@ async def lifespan(app: FastAPI):
     
     #setup the SANA pipeline
     app.pipeline = load_pipeline()
-    app.pipeline.enable_vae_slicing()
+    enable_vae_tiling(app.pipeline)
     app.pipeline.to("cuda")
-    compile_pipeline(app.pipeline)
+    app.pipeline_valid_keys = frozenset(inspect.signature(app.pipeline.__call__).parameters)
+    #all pipeline calls run on one thread so compiled cuda graphs recorded at warmup are replayed for requests
+    app.inference_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+    app.inference_stream = torch.cuda.Stream()
+    app.pipeline_lock = asyncio.Semaphore(1)
+    await asyncio.get_running_loop().run_in_executor(app.inference_executor, compile_pipeline, app.pipeline)
+    
+    #LRU cache of prompt embeds, stored in pinned cpu memory to keep VRAM free for the pipeline
+    app.prompt_embeds_cache = OrderedDict()
+    await asyncio.get_running_loop().run_in_executor(app.inference_executor, prewarm_prompt_embeds, app.pipeline, app.prompt_embeds_cache)
     
     #setup the prompt enhancement LLM
     app.llm, app.llm_tokenizer = load_llm()
     app.llm.to("cuda")
+    if os.environ.get("QUANTIZE_LLM", "") != "":
+        #weight only quantization, generate() is memory bandwidth bound in the decoder
+        from torchao.quantization import quantize_, Int8WeightOnlyConfig
+        quantize_(app.llm, Int8WeightOnlyConfig())
+    #static instruction prefix is tokenized once, only the user prompt is tokenized per request
+    app.llm_prefix_ids = app.llm_tokenizer(llm_instruction, add_special_tokens=False, return_tensors="pt").input_ids.to("cuda")
+    app.llm_generation_config = copy.deepcopy(app.llm.generation_config)
+    app.llm_generation_config.update(max_new_tokens=77, do_sample=False, use_cache=True)
     
     yield
     
     logger.info("Shutting down")
+    app.inference_executor.shutdown(wait=False, cancel_futures=True)
 
 def load_pipeline():
     torch_dtype = torch.float16
@@ -106,15 +138,48 @@ def load_pipeline():
     else:
         return DiffusionPipeline.from_pretrained(model_id, use_safetensors=True, torch_dtype=torch_dtype)
 
+def enable_vae_tiling(pipeline):
+    """
+    Decode latents in tiles to bound peak activation memory, tile size can be set with VAE_TILE_SIZE env.
+    """
+    pipeline.enable_vae_tiling()
+    tile_size = os.environ.get("VAE_TILE_SIZE", "")
+    if tile_size != "":
+        tile_size = int(tile_size)
+        try:
+            #AutoencoderDC (SANA) derives the latent tile size from the sample tile size, the stride is scaled with it
+            #(default 448 for 512 tiles) so tiles overlap for blending, kept a multiple of the 32x latent compression
+            tile_stride = max(32, (tile_size * 7 // 8) // 32 * 32)
+            pipeline.vae.enable_tiling(
+                tile_sample_min_height=tile_size,
+                tile_sample_min_width=tile_size,
+                tile_sample_stride_height=tile_stride,
+                tile_sample_stride_width=tile_stride,
+            )
+        except TypeError:
+            pipeline.vae.tile_sample_min_size = tile_size
+            pipeline.vae.tile_latent_min_size = int(tile_size / (2 ** (len(pipeline.vae.config.block_out_channels) - 1)))
+
+#precision sensitive transformer layers kept out of fp8 dynamic quantization, time_embed covers the timestep path
+fp8_excluded_layers = ("proj_out", "time_embed", "caption_projection")
+
+def fp8_dynamic_filter(module, fqn):
+    return isinstance(module, torch.nn.Linear) and not fqn.startswith(fp8_excluded_layers)
+
 def compile_pipeline(pipeline):
     compile_text_encoder = os.environ.get("TORCH_COMPILE_TEXT_ENCODER","")
     compile_transformer = os.environ.get("TORCH_COMPILE_TRANSFORMER", "")
     quantize_transformer = os.environ.get("QUANTIZE_MODEL", "")
+    cuda_graph_transformer = os.environ.get("CUDA_GRAPH_TRANSFORMER", "")
     
     if compile_text_encoder != "":
         pipeline.text_encoder = torch.compile(pipeline.text_encoder, mode="reduce-overhead")
     
-    if quantize_transformer != "":
+    if quantize_transformer == "FP8_DYNAMIC":
+        #fp8 activations and weights run the matmuls on fp8 tensor cores (Hopper+)
+        from torchao.quantization import quantize_, PerTensor, Float8DynamicActivationFloat8WeightConfig
+        quantize_(pipeline.transformer, Float8DynamicActivationFloat8WeightConfig(granularity=PerTensor()), filter_fn=fp8_dynamic_filter)
+    elif quantize_transformer != "":
         from torchao.quantization import quantize_, PerTensor, Float8WeightOnlyConfig
         quantize_(pipeline.transformer, Float8WeightOnlyConfig())
         #pipeline.transformer = autoquant(pipeline.transformer, error_on_unseen=False)
@@ -127,22 +192,87 @@ def compile_pipeline(pipeline):
         torch._inductor.config.coordinate_descent_tuning = True
         torch._inductor.config.coordinate_descent_check_all_directions = True
         torch._inductor.config.epilogue_fusion = False
+        #manual transformer cuda graph cannot be captured around inductor cudagraphs
+        torch._inductor.config.triton.cudagraphs = cuda_graph_transformer == ""
+        #allow a compiled graph per warmup shape without hitting the recompile limit
+        torch._dynamo.config.cache_size_limit = 64
         
         pipeline.transformer.to(memory_format=torch.channels_last)
-        pipeline.transformer = torch.compile(pipeline.transformer, mode="reduce-overhead", fullgraph=True)
+        transformer_mode = "reduce-overhead" if cuda_graph_transformer == "" else "max-autotune-no-cudagraphs"
+        pipeline.transformer = torch.compile(pipeline.transformer, mode=transformer_mode, fullgraph=True)
         pipeline.vae.to(memory_format=torch.channels_last)
         pipeline.vae.decode = torch.compile(pipeline.vae.decode, mode="reduce-overhead", fullgraph=True)
     
-    #run first req to quantize and compile
-    pipeline(prompt="a green ball", num_inference_steps=2)
+    if cuda_graph_transformer != "":
+        #denoise step at the first warmup shape is captured and replayed per step for matching requests
+        pipeline.transformer = CUDAGraphTransformer(pipeline.transformer)
+        pipeline.transformer.arm()
     
+    #run first req for each served shape to quantize and compile, avoids recompiling on first real request
+    #warmup runs under inference_mode like requests so compiled graphs are not recompiled for a different grad mode
+    for height, width, num_images in warmup_shapes():
+        start_time = time.time()
+        with torch.inference_mode():
+            pipeline(prompt="a green ball", height=height, width=width, num_images_per_prompt=num_images, num_inference_steps=2, output_type="pt")
+        logger.info(f"warmup {height}x{width}x{num_images} took {time.time() - start_time} seconds")
+
+def warmup_shapes():
+    """
+    Shapes as (height, width, num_images_per_prompt) from WARMUP_SHAPES env, e.g. [[1024,1024,1],[512,512,1]]
+    """
+    shapes = os.environ.get("WARMUP_SHAPES", "")
+    if shapes == "":
+        return [(1024, 1024, 1), (512, 512, 1)]
+    try:
+        parsed = json.loads(shapes)
+        if not isinstance(parsed, list) or not all(isinstance(shape, list) and len(shape) == 3 for shape in parsed):
+            raise ValueError("WARMUP_SHAPES entries must be [height, width, num_images]")
+        parsed = [tuple(int(v) for v in shape) for shape in parsed]
+        if any(v <= 0 for shape in parsed for v in shape):
+            raise ValueError("WARMUP_SHAPES values must be positive")
+        return parsed
+    except (json.JSONDecodeError, TypeError, ValueError):
+        logger.error("WARMUP_SHAPES is not a valid list of [height, width, num_images], using defaults")
+        return [(1024, 1024, 1), (512, 512, 1)]
+    
+def prewarm_prompt_embeds(pipeline, cache):
+    """
+    Fill the prompt embeds cache from PROMPT_WARMUP_FILE, a json list of prompts, so known prompts skip encoding on first request.
+    Runs on the inference executor thread like request prompt encodes.
+    """
+    warmup_file = os.environ.get("PROMPT_WARMUP_FILE", "")
+    if warmup_file == "":
+        return
+    try:
+        with open(warmup_file, 'r') as file:
+            prompts = json.load(file)
+    except (OSError, json.JSONDecodeError) as e:
+        logger.error(f"could not load prompt warmup file, skipping prompt warmup: {e}")
+        return
+    if not isinstance(prompts, list):
+        logger.error("could not load prompt warmup file, skipping prompt warmup: expected a json list of prompts")
+        return
+    
+    start_time = time.time()
+    for prompt in prompts[:max_prompt_embeds]:
+        if not isinstance(prompt, str):
+            logger.error(f"could not load prompt warmup entry, skipping non string prompt: {prompt!r}")
+            continue
+        generate_prompt_embeds(pipeline.encode_prompt, cache, prompt)
+    logger.info(f"prompt warmup of {len(cache)} prompts took {time.time() - start_time} seconds")
+
 def load_llm():
     model_id = os.environ.get("LLM_MODEL_ID", "roborovski/superprompt-v1")
     model = T5ForConditionalGeneration.from_pretrained(model_id)
+    model.eval()
     tokenizer = T5TokenizerFast.from_pretrained(model_id)
     return (model, tokenizer)
 
-app = FastAPI(lifespan=lifespan)
+async def register():
+    if not await register_to_orchestrator():
+        logger.error("failed to register to orchestrator")
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 @app.get("/health")
 async def health(request: Request):
@@ -155,7 +285,7 @@ async def hardware_info(request: Request):
     
 @app.post("/text-to-image")
 async def t2i(request: Request):
-    params = await request.json()
+    params = orjson.loads(await request.body())
     seed = params.pop("seed", 0)
     if int(seed) == 0:
         seed = int(''.join(random.choice('0123456789') for _ in range(10)))
@@ -165,23 +295,17 @@ async def t2i(request: Request):
         if "prompt" not in params:
             raise Exception("prompt not included")
         
-        embeds, attn_mask = await generate_prompt_embeds(request.app.pipeline.encode_prompt, params["prompt"])
-        params["prompt"] = None
-        params["prompt_embeds"] = embeds
-        params["prompt_attention_mask"] = attn_mask
-        start_time = time.time()
-        output = await generate_image(request.app.pipeline, output_type="np",**params)
-        logger.info(f"inference took {time.time() - start_time} seconds")
-        image_array = (output.images[0] * 255).astype(np.uint8)
-        image = Image.fromarray(image_array)
-        img_buf.seek(0)
-        img_buf.truncate(0)
-        image.save(img_buf, format="JPEG")
+        #pipeline is single tenant (compiled graphs), run inference off the event loop one request at a time
+        async with request.app.pipeline_lock:
+            params["output_type"] = "pt"
+            start_time = time.time()
+            output = await asyncio.get_running_loop().run_in_executor(
+                request.app.inference_executor, run_inference, request.app.pipeline, request.app.pipeline_valid_keys, request.app.inference_stream, request.app.prompt_embeds_cache, params
+            )
+            logger.info(f"inference took {time.time() - start_time} seconds")
+        img_bytes = await asyncio.to_thread(encode_image, output.images[0])
         logger.info(f"save to binary took {time.time() - start_time} seconds")
-        #output.images[0].save("/models/test.png")
-        img_bytes = img_buf.getvalue()
-        logger.info(f"bytes read took {time.time() - start_time} seconds")
-        return Response(content=img_bytes, media_type="image/png", headers={"X-Metadata": json.dumps({"seed": seed})})
+        return Response(content=img_bytes, media_type=img_media_type, headers={"X-Metadata": orjson.dumps({"seed": seed}).decode()})
     except Exception as e:
         logger.error(f"error processing request: {e}")
         status_code = 500
@@ -195,42 +319,81 @@ async def t2i(request: Request):
 
 @app.post("/prompt-enhance")
 async def prompt_enhance(request: Request):
-    params = await request.json()
+    params = orjson.loads(await request.body())
     if not "prompt" in params:
         raise Exception("request error: prompt not included")
      
-    input_text = f"Expand the following prompt to add more detail: {params['prompt']}"
-    inputs = request.app.llm_tokenizer(input_text, return_tensors="pt").input_ids.to(app.llm.device)
-    output = request.app.llm.generate(inputs, max_new_tokens=77)
-    output_txt = request.app.llm_tokenizer.decode(output[0], skip_special_tokens=True)
+    #LLM generate blocks, run it off the event loop
+    output_txt = await asyncio.to_thread(enhance_prompt, params["prompt"])
     return {"prompt": output_txt}
     
 
-async def generate_image(func, **kwargs):
+def run_inference(pipeline, valid_keys, stream, embeds_cache, kwargs):
+    """
+    Encode the prompt and run the pipeline on the dedicated inference stream, called from the inference executor thread.
+    """
+    #order after any work queued on the default stream
+    stream.wait_stream(torch.cuda.default_stream())
+    with torch.cuda.stream(stream):
+        #prompt encode runs on this thread too, the compiled text encoder graphs are recorded here at warmup
+        embeds, attn_mask = generate_prompt_embeds(pipeline.encode_prompt, embeds_cache, kwargs["prompt"])
+        kwargs["prompt"] = None
+        kwargs["prompt_embeds"] = embeds
+        kwargs["prompt_attention_mask"] = attn_mask
+        output = generate_image(pipeline, valid_keys, **kwargs)
+    stream.synchronize()
+    return output
+
+def generate_image(func, valid_keys, **kwargs):
+    """
+    Call `func` with only those keyword arguments in `valid_keys`, computed once at startup from its signature.
+    """
+    with torch.inference_mode():
+        return func(**{k: v for k, v in kwargs.items() if k in valid_keys})
+
+def encode_image(image):
+    #image is a (3, H, W) float tensor in [0, 1], encode with libjpeg-turbo/libpng in torchvision
+    image_tensor = image.mul(255).round_().clamp_(0, 255).to(torch.uint8).cpu()
+    if img_format == "PNG":
+        #zlib level 1, default level 6 dominates encode time for large images
+        return torchvision.io.encode_png(image_tensor, compression_level=1).numpy().tobytes()
+    else:
+        return torchvision.io.encode_jpeg(image_tensor, quality=90).numpy().tobytes()
+
+@lru_cache(maxsize=1024)
+def enhance_prompt(prompt):
+    """
+    Expand `prompt` with the prompt enhancement LLM, repeated prompts are served from the cache.
+    """
+    prompt_ids = app.llm_tokenizer(prompt, return_tensors="pt").input_ids.to(app.llm.device)
+    inputs = torch.cat([app.llm_prefix_ids, prompt_ids], dim=1)
+    with torch.inference_mode():
+        output = app.llm.generate(inputs, generation_config=app.llm_generation_config)
+    return app.llm_tokenizer.decode(output[0], skip_special_tokens=True)
+
+def generate_prompt_embeds(func, cache, prompt):
     """
-    Call `func` with only those keyword arguments that are valid for it.
+    Return cached prompt embeds for `prompt` or encode them with `func`, only called from the inference executor thread.
     """
-    sig = inspect.signature(func)
-    valid_keys = set(sig.parameters)
-    filtered_kwargs = {k: v for k, v in kwargs.items() if k in valid_keys}
-    return func(**filtered_kwargs)
-
-async def generate_prompt_embeds(func, prompt):
-    prompt_hash = hash(prompt)
-    if prompt_hash in generated_prompt_embeds:
-        return generated_prompt_embeds[prompt_hash]
+    prompt_hash = hashlib.blake2b(prompt.encode("utf-8"), digest_size=16).digest()
+    if prompt_hash in cache:
+        cache.move_to_end(prompt_hash)
+        embeds, attn_mask = cache[prompt_hash]
+        return (embeds.to("cuda", non_blocking=True), attn_mask.to("cuda", non_blocking=True))
     else:
-        torch.cuda.empty_cache()
-        embeds, attn_mask = func(
-                                prompt,
-                                num_images_per_prompt=1,
-                                device="cuda",
-                                prompt_embeds=None,
-                                prompt_attention_mask=None,
-                                clean_caption=False,
-                                max_sequence_length=300,
-                                complex_human_instruction=sys_instruction,
-                                lora_scale=None,
-                            )
-        generated_prompt_embeds[prompt_hash] = (embeds, attn_mask)
+        with torch.inference_mode():
+            embeds, attn_mask = func(
+                                    prompt,
+                                    num_images_per_prompt=1,
+                                    device="cuda",
+                                    prompt_embeds=None,
+                                    prompt_attention_mask=None,
+                                    clean_caption=False,
+                                    max_sequence_length=300,
+                                    complex_human_instruction=sys_instruction,
+                                    lora_scale=None,
+                                )
+        cache[prompt_hash] = (embeds.detach().cpu().pin_memory(), attn_mask.detach().cpu().pin_memory())
+        if len(cache) > max_prompt_embeds:
+            cache.popitem(last=False)
         return (embeds, attn_mask)
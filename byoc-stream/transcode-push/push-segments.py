@@ -49,6 +49,9 @@ headers = {
     'Livepeer-Transcode-Configuration': tsc_str
 }
 
+# one session for all segment posts so the gateway connection is kept alive between segments
+session = requests.Session()
+
 sse_running = False
 def listen_sse(url):
     url = url.replace("https://192.168.1.15.sslip.io:8088/gateway", "http://localhost:5937")
@@ -79,7 +82,8 @@ for i in range(0, 11):
         payload = f.read()
 
     try:
-        r = requests.post(f"http://localhost:5937/live2/test/{i}.ts", data=payload, headers=headers)
+        #bounded so a stuck gateway fails the segment instead of hanging the script, read timeout matches the job timeout
+        r = session.post(f"http://localhost:5937/live2/test/{i}.ts", data=payload, headers=headers, timeout=(5, transcode_config["aiParams"]["timeout_seconds"]))
     except Exception as e:
         print(f"Request failed for {seg_name}: {e}")
         continue
@@ -4,6 +4,7 @@ import sys
 import time
 import requests
 import json
+from requests.adapters import HTTPAdapter
 
 #set where to send registration request
 ORCH_URL = os.environ.get("ORCH_URL", "")
@@ -20,6 +21,12 @@ CAPABILITY_PRICE_SCALING = os.environ.get("CAPABILITY_PRICE_SCALING", 1)
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
+#reuse one pooled connection to the orchestrator across retries instead of a new TLS handshake per attempt
+session = requests.Session()
+session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=4, max_retries=0))
+session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=4, max_retries=0))
+session.verify = False
+
 def register_to_orchestrator():
     
     register_req = {
@@ -40,7 +47,7 @@ def register_to_orchestrator():
     logger.info("registering: "+json.dumps(register_req))
     for attempt in range(1, max_retries + 1):
         try:
-            response = requests.post(ORCH_URL+"/capability/register", json=register_req, headers=headers, timeout=5, verify=False)  # You can change to POST or other method
+            response = session.post(ORCH_URL+"/capability/register", json=register_req, headers=headers, timeout=5)  # You can change to POST or other method
             if response.status_code == 200:
                 logger.info("Capability registered")
                 return True
@@ -48,12 +55,15 @@ def register_to_orchestrator():
                 logger.error("orch secret incorrect")
                 return False
             else:
-                logger.info(f"Attempt {attempt} failed: {e}")
+                logger.info(f"Attempt {attempt} failed: {response.status_code}")
         except requests.RequestException as e:
-            if attempt == max_retries:
-                logger.error("All retries failed.")
-            else:
-                time.sleep(delay)
+            logger.info(f"Attempt {attempt} failed: {e}")
+
+        if attempt < max_retries:
+            time.sleep(delay)
+    #not successful, return false
+    logger.error("All retries failed.")
+    return False
 
 if __name__ == "__main__":
     registered = register_to_orchestrator()
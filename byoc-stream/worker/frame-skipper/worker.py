@@ -8,6 +8,7 @@ import time
 import torch
 import cv2
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from pytrickle import StreamProcessor
 from pytrickle.frames import VideoFrame
 from pytrickle.frame_skipper import FrameSkipConfig
@@ -23,6 +24,15 @@ ready = False
 processor = None
 background_tasks = []
 background_task_started = False
+copy_stream = None  # dedicated CUDA stream for frame copies when frames are on the GPU
+pinned_in = None  # pinned staging buffers for device <-> host frame copies
+pinned_out = None
+green_lut = None  # per channel HSV lookup table for the current intensity
+green_lut_intensity = None
+hsv_buf = None  # reused uint8 OpenCV outputs, only the float result is handed back per frame
+rgb_buf = None
+# single worker keeps frames in order and the reused buffers above owned by one thread
+transform_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="transform")
 
 async def load_model(**kwargs):
     """Initialize processor state - called during model loading phase."""
@@ -37,6 +47,16 @@ async def load_model(**kwargs):
     # Load the model here if needed
     # model = torch.load('my_model.pth')
     
+    # Warm up the frame path on the device real frames arrive on, so the first frame
+    # does not pay for CUDA context creation, copy stream and pinned buffer setup
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    dummy_tensor = torch.zeros(1, 512, 512, 3, device=device)
+    loop = asyncio.get_running_loop()
+    for _ in range(5):
+        await loop.run_in_executor(transform_executor, transform_frame, dummy_tensor)
+    if device == "cuda":
+        torch.cuda.synchronize()
+    
     # Note: Cannot start background tasks here as event loop isn't running yet
     # Background task will be started when first frame is processed
     ready = True
@@ -94,9 +114,60 @@ async def on_stream_stop():
     background_task_started = False  # Reset flag for next stream
     logger.info("All background tasks cleaned up")
 
+def get_green_lut(intensity: float) -> np.ndarray:
+    """Build (once per intensity) the HSV lookup table that shifts hue towards green and boosts saturation."""
+    global green_lut, green_lut_intensity
+    if green_lut is None or green_lut_intensity != intensity:
+        values = np.arange(256, dtype=np.float64)
+        hue_shift = intensity * 30  # Maximum hue shift of 30 degrees towards green
+        saturation_boost = intensity * 50  # Boost saturation by up to 50
+        lut = np.empty((256, 1, 3), dtype=np.uint8)
+        lut[:, 0, 0] = ((values + hue_shift) % 180).astype(np.uint8)
+        lut[:, 0, 1] = np.clip(values + saturation_boost, 0, 255).astype(np.uint8)
+        lut[:, 0, 2] = values.astype(np.uint8)  # value channel unchanged
+        green_lut = lut
+        green_lut_intensity = intensity
+    return green_lut
+
+def to_host(tensor: torch.Tensor) -> np.ndarray:
+    """Copy frame tensor to host memory, CUDA tensors are copied through a pinned buffer on the copy stream."""
+    global copy_stream, pinned_in
+    if not tensor.is_cuda:
+        return tensor.numpy()
+    
+    if copy_stream is None:
+        copy_stream = torch.cuda.Stream(device=tensor.device)
+    if pinned_in is None or pinned_in.shape != tensor.shape or pinned_in.dtype != tensor.dtype:
+        pinned_in = torch.empty(tensor.shape, dtype=tensor.dtype, pin_memory=True)
+    
+    # also waits for the previous frame's upload from pinned_out
+    copy_stream.wait_stream(torch.cuda.current_stream(tensor.device))
+    with torch.cuda.stream(copy_stream):
+        pinned_in.copy_(tensor, non_blocking=True)
+    copy_stream.synchronize()
+    return pinned_in.numpy()
+
+def to_device(tensor: torch.Tensor, device: torch.device) -> torch.Tensor:
+    """Copy host tensor to the frame device, CUDA uploads are staged in pinned memory on the copy stream."""
+    global pinned_out
+    if device.type != "cuda":
+        return tensor
+    
+    if pinned_out is None or pinned_out.shape != tensor.shape or pinned_out.dtype != tensor.dtype:
+        pinned_out = torch.empty(tensor.shape, dtype=tensor.dtype, pin_memory=True)
+    pinned_out.copy_(tensor)
+    
+    with torch.cuda.stream(copy_stream):
+        result = pinned_out.to(device, non_blocking=True)
+    # consumers on the current stream must see the finished upload
+    current_stream = torch.cuda.current_stream(device)
+    current_stream.wait_stream(copy_stream)
+    result.record_stream(current_stream)
+    return result
+
 async def process_video(frame: VideoFrame) -> VideoFrame:
     """Apply horizontal flip and green hue using OpenCV."""
-    global intensity, ready, delay
+    global ready, delay
     
     # Start background task on first frame (when event loop is running)
     start_background_task()
@@ -104,8 +175,19 @@ async def process_video(frame: VideoFrame) -> VideoFrame:
     # Simulated processing time
     if delay > 0:
         await asyncio.sleep(delay)
+    
+    # OpenCV work runs on the transform thread so the event loop keeps serving the stream
+    result_tensor = await asyncio.get_running_loop().run_in_executor(transform_executor, transform_frame, frame.tensor)
+    if result_tensor is None:
+        return frame
+    
+    return frame.replace_tensor(result_tensor)
 
-    frame_tensor = frame.tensor
+def transform_frame(tensor: torch.Tensor):
+    """Flip and green hue a frame tensor, returns None if the tensor shape is not supported."""
+    global intensity, hsv_buf, rgb_buf
+    
+    frame_tensor = tensor
     
     # Track if we need to add batch dimension back
     had_batch_dim = False
@@ -119,54 +201,56 @@ async def process_video(frame: VideoFrame) -> VideoFrame:
             had_batch_dim = True
         else:
             logger.error(f"Unexpected batch size: {frame_tensor.shape[0]}")
-            return frame
+            return None
     
     # Convert torch tensor to numpy array for OpenCV processing
     # Handle different tensor formats (CHW or HWC)
     if len(frame_tensor.shape) == 3:
         if frame_tensor.shape[0] == 3:  # CHW format (3, height, width)
             # Convert CHW to HWC for OpenCV
-            img = frame_tensor.permute(1, 2, 0).cpu().numpy()
+            img = to_host(frame_tensor.permute(1, 2, 0))
             was_chw = True
         else:  # HWC format (height, width, 3)
-            img = frame_tensor.cpu().numpy()
+            img = to_host(frame_tensor)
             was_chw = False
     else:
         logger.error(f"Unexpected tensor shape after processing: {frame_tensor.shape}")
-        return frame
+        return None
     
     # Ensure the image is in the correct range [0, 255] for OpenCV
+    # The horizontal flip is folded into this conversion by reading through a reversed-width view,
+    # so no separate flip pass over the frame is needed
+    img_mirrored = img[:, ::-1]
     if img.max() <= 1.0:
-        img = (img * 255).astype(np.uint8)
+        img_flipped = (img_mirrored * 255).astype(np.uint8)
         was_normalized = True
     else:
-        img = img.astype(np.uint8)
+        img_flipped = img_mirrored.astype(np.uint8)
         was_normalized = False
     
-    # Apply horizontal flip using OpenCV
-    img_flipped = cv2.flip(img, 1)  # 1 = horizontal flip
-    
-    # Add green hue by enhancing the green channel
-    # Convert to HSV for better color manipulation
-    img_hsv = cv2.cvtColor(img_flipped, cv2.COLOR_RGB2HSV)
-    
-    # Enhance green hue (hue value around 60 degrees for green in OpenCV HSV)
-    # Adjust the hue towards green and increase saturation
-    hue_shift = intensity * 30  # Maximum hue shift of 30 degrees towards green
-    
-    # Shift hue towards green
-    img_hsv[:, :, 0] = ((img_hsv[:, :, 0] + hue_shift) % 180).astype(np.uint8)
+    # Zero intensity leaves hue and saturation unchanged, skip both HSV conversions
+    if intensity <= 0.0:
+        img_green = img_flipped
+    else:
+        # Add green hue by enhancing the green channel
+        # Convert to HSV for better color manipulation
+        if hsv_buf is None or hsv_buf.shape != img_flipped.shape:
+            hsv_buf = np.empty_like(img_flipped)
+            rgb_buf = np.empty_like(img_flipped)
+        img_hsv = cv2.cvtColor(img_flipped, cv2.COLOR_RGB2HSV, dst=hsv_buf)
     
-    # Increase saturation to make the green more vibrant
-    saturation_boost = intensity * 50  # Boost saturation by up to 50
-    img_hsv[:, :, 1] = np.clip(img_hsv[:, :, 1] + saturation_boost, 0, 255).astype(np.uint8)
+        # Enhance green hue (hue value around 60 degrees for green in OpenCV HSV)
+        # Shift hue towards green and increase saturation in one in-place lookup pass
+        # instead of float temporaries for each channel
+        cv2.LUT(img_hsv, get_green_lut(intensity), dst=img_hsv)
     
-    # Convert back to RGB
-    img_green = cv2.cvtColor(img_hsv, cv2.COLOR_HSV2RGB)
+        # Convert back to RGB
+        img_green = cv2.cvtColor(img_hsv, cv2.COLOR_HSV2RGB, dst=rgb_buf)
     
     # Convert back to torch tensor
     if was_normalized:
-        img_result = img_green.astype(np.float32) / 255.0
+        # convert and scale in one pass into a single new float buffer
+        img_result = np.divide(img_green, 255.0, dtype=np.float32)
     else:
         img_result = img_green.astype(np.float32)
     
@@ -182,9 +266,7 @@ async def process_video(frame: VideoFrame) -> VideoFrame:
         result_tensor = result_tensor.unsqueeze(0)
     
     # Move to same device as original tensor
-    result_tensor = result_tensor.to(frame.tensor.device)
-    
-    return frame.replace_tensor(result_tensor)
+    return to_device(result_tensor, tensor.device)
 
 async def update_params(params: dict):
     """Update green hue intensity (0.0 to 1.0)."""
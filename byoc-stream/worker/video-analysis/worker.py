@@ -1,4 +1,5 @@
 import asyncio
+import queue
 import subprocess
 import threading
 from collections import deque
@@ -90,9 +91,13 @@ def start_webserver(frame_queue, result_queue, lock_frame_queue):
             else:
                 timestamp_sec = None
 
-            # Send buffer + timestamp to inference process
+            # Send buffer + timestamp to inference process, drop the frame if the queue is full
+            # rather than blocking the event loop until the inference process drains it
             if not lock_frame_queue.is_set():
-                frame_queue.put((img_tensor, timestamp_sec))
+                try:
+                    frame_queue.put_nowait((img_tensor, timestamp_sec))
+                except queue.Full:
+                    pass
             return frame
         except Exception as e:
             logger.error(f"Video processing failed: {e}")
@@ -144,24 +149,42 @@ def start_inference(frame_queue, result_queue, lock_frame_queue):
     _wait_for_model()
     logger.info("LMDeploy server ready, starting inference loop")
 
+    def get_frame():
+        # bounded wait so the executor thread returns and the loop can be cancelled on shutdown
+        try:
+            return frame_queue.get(timeout=1.0)
+        except queue.Empty:
+            return None
+
     async def run():
         history = []
+        loop = asyncio.get_running_loop()
 
         try:
             while True:
                 try:
-                    # Wait until at least 5 frames are in the queue
-                    if frame_queue.qsize() < 5:
-                        await asyncio.sleep(0.05)
-                        continue
+                    # Wait until at least 5 frames have arrived, blocking gets in the executor
+                    # wake up on the next frame instead of polling the queue size
+                    frames = []
+                    while len(frames) < 5:
+                        frame = await loop.run_in_executor(None, get_frame)
+                        if frame is not None:
+                            frames.append(frame)
 
-                    # Drain all frames
+                    # Drain all frames, the producer refills freed slots while we collect
+                    # so keep only the newest 5 to hold the batch at 5 frames
                     lock_frame_queue.set()
+                    while True:
+                        try:
+                            frames.append(frame_queue.get_nowait())
+                        except queue.Empty:
+                            break
+                    frames = frames[-5:]
+
                     frame_contents = []
                     start = time.time()
                     last_timestamp = None
-                    while not frame_queue.empty():
-                        frame = frame_queue.get()
+                    for frame in frames:
                         img = to_pil(frame[0])
 
                         buf = io.BytesIO()
@@ -5,7 +5,6 @@ Connects to the SignallingWebServer to receive video/audio stream
 """
 
 import asyncio
-from email import message
 import json
 import logging
 import os
@@ -18,24 +17,28 @@ from aiortc import (
     RTCConfiguration,
     RTCIceServer,
 )
-from aiortc.contrib.media import MediaPlayer, MediaRecorder
 from typing import Callable, Optional
 
 logger = logging.getLogger(__name__)
 
 class PixelStreamingClient:
-    def __init__(self, signalling_url="ws://localhost:8080", frame_callback: Optional[Callable] = None, max_fps: int = 60):
+    def __init__(self, signalling_url="ws://localhost:8080", frame_callback: Optional[Callable] = None, max_fps: int = 60, audio_callback: Optional[Callable] = None):
         self.signalling_url = signalling_url
         self.websocket = None
         self.max_fps = max_fps
         self.frame_interval = 1.0 / max_fps if max_fps > 0 else 0
         # Configure STUN so we generate viable candidates by default; can override via STUN_SERVER env
+        # Set STUN_SERVER to empty when the host address is directly reachable to skip STUN gathering
         stun_url = os.getenv("STUN_SERVER", "stun:stun.l.google.com:19302")
-        configuration = RTCConfiguration(iceServers=[RTCIceServer(urls=[stun_url])])
+        ice_servers = [RTCIceServer(urls=[stun_url])] if stun_url else []
+        configuration = RTCConfiguration(iceServers=ice_servers)
 
         self.pc = RTCPeerConnection(configuration=configuration)
         self.video_track = None
         self.frame_callback = frame_callback
+        # audio frames go to a dedicated callback when provided so callers
+        # do not need to dispatch on frame type per frame
+        self.audio_callback = audio_callback or frame_callback
         self.pending_candidates: list[dict] = []
 
 
@@ -48,6 +51,8 @@ class PixelStreamingClient:
         self._running = True
         self.tasks = set()
         self.listen_task = None
+        self.dropped_video_frames = 0
+        self._warned_no_track_queue = False
 
     async def connect(self):
         """Connect to the signalling server"""
@@ -93,8 +98,10 @@ class PixelStreamingClient:
 
         elif msg_type == "offer":
             # WebRTC offer from streamer
-            sdp_formatted = message.get("sdp", "").replace("\\r\\n", "\n")
-            logger.info(f"Received WebRTC offer:\nType: {message.get('type')}\nSDP:\n{sdp_formatted}")
+            logger.info(f"Received WebRTC offer: {message.get('type')}")
+            if logger.isEnabledFor(logging.DEBUG):
+                sdp_formatted = message.get("sdp", "").replace("\\r\\n", "\n")
+                logger.debug(f"Offer SDP:\n{sdp_formatted}")
 
             await self.handle_offer(message)
 
@@ -127,7 +134,9 @@ class PixelStreamingClient:
         # Create answer
         answer = await self.pc.createAnswer()
         await self.pc.setLocalDescription(answer)
-        logger.info(f"Created WebRTC answer:\nType: {answer.type}\nSDP:\n{answer.sdp}")
+        logger.info(f"Created WebRTC answer: {answer.type}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Answer SDP:\n{answer.sdp}")
         # Send answer back (flat SDP string to match offer shape)
         await self.send_message({
             "type": "answer",
@@ -244,8 +253,8 @@ class PixelStreamingClient:
                 continue
 
             try:
-                if self.frame_callback and self._running:
-                    await self.frame_callback(frame)
+                if self.audio_callback and self._running:
+                    await self.audio_callback(frame)
             except Exception as e:
                 logger.error(f"Audio callback error: {e}")
 
@@ -268,6 +277,9 @@ class PixelStreamingClient:
                     await asyncio.sleep(0.01)
                     continue
 
+                # Skip ahead to the newest decoded frame if we fell behind
+                frame = self._newest_queued_frame(self.video_track, frame)
+
                 # FPS limiting
                 if self.frame_interval > 0:
                     current_time = time.time()
@@ -288,6 +300,39 @@ class PixelStreamingClient:
             logger.error(f"Video processing loop died: {e}")
             raise
 
+    def _newest_queued_frame(self, track, frame):
+        """Drop frames decoded while the last frame was processed, keeps the track queue bounded"""
+        # relies on aiortc internals (pinned in requirements.txt): RemoteStreamTrack._queue is the
+        # asyncio.Queue of decoded frames and a None entry in it marks the end of the track
+        queue = getattr(track, "_queue", None)
+        if queue is None:
+            if not self._warned_no_track_queue:
+                logger.warning("Video track has no _queue, stale frames will not be dropped. check the aiortc version")
+                self._warned_no_track_queue = True
+            return frame
+
+        dropped = 0
+        while not queue.empty():
+            newer = queue.get_nowait()
+            if newer is None:
+                # end of track marker, leave it for the next recv() to raise on
+                queue.put_nowait(None)
+                break
+            frame = newer
+            dropped += 1
+
+        if dropped:
+            self.dropped_video_frames += dropped
+            logger.debug(f"Dropped {dropped} stale video frames ({self.dropped_video_frames} total)")
+        return frame
+
+    def stop_receiving(self):
+        """Stop frame delivery by cancelling the track receive tasks"""
+        self._running = False
+        for task in list(self.tasks):
+            if not task.done():
+                task.cancel()
+
     async def disconnect(self):
         """Disconnect from server"""
         logger.info("Disconnecting PixelStreamingClient...")
@@ -9,9 +9,8 @@ import logging
 import os
 import av
 import signal  
-import numpy as np
 import torch
-from typing import Union
+from concurrent.futures import ThreadPoolExecutor
 from pytrickle.stream_processor import StreamProcessor
 from pytrickle.frames import VideoFrame, AudioFrame
 from pixel_streaming import PixelStreamingClient
@@ -33,32 +32,41 @@ client: PixelStreamingClient | None = None
 params = {"commands": {}, "audio": ""}
 shutdown_event = asyncio.Event()  # <-- Add shutdown signal
 background_tasks = set()  # <-- Track all tasks
+# single thread keeps frames in order and keeps pixel conversion off the event loop
+convert_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="frame-convert")
 
 
 # ------------------ Frame Processing ------------------ #
 
-async def send_frame(frame: Union[av.VideoFrame, av.AudioFrame]):
-    """Send frame to processor if available."""
+async def send_video_frame(frame: av.VideoFrame):
+    """Convert video frame to tensor and send to processor if available."""
     global sp
     if not sp:
         return
 
     try:
-        if isinstance(frame, av.VideoFrame):
-            frame_np = frame.to_ndarray(format="rgb24").astype(np.float32) / 255.0
-            frame_tensor = torch.from_numpy(frame_np)
-            await sp.send_input_frame(VideoFrame.from_av_video(frame_tensor, frame.pts, frame.time_base))
-        elif isinstance(frame, av.AudioFrame):
-            await sp.send_input_frame(AudioFrame.from_av_audio(frame))
+        frame_tensor = await asyncio.get_running_loop().run_in_executor(convert_executor, frame_to_tensor, frame)
+        await sp.send_input_frame(VideoFrame.from_av_video(frame_tensor, frame.pts, frame.time_base))
     except Exception as e:
-        logger.error(f"Error sending frame: {e}")
+        logger.error(f"Error sending video frame: {e}")
 
 
-async def pixel_streaming_frame_callback(frame):
-    """Callback to process frames from Pixel Streaming client."""
-    if shutdown_event.is_set():  # <-- Don't process frames during shutdown
+def frame_to_tensor(frame: av.VideoFrame):
+    """Convert a decoded video frame to a normalized float HWC tensor, runs on the convert executor."""
+    # normalize in place so only one float buffer is allocated per frame
+    return torch.from_numpy(frame.to_ndarray(format="rgb24")).to(torch.float32).div_(255.0)
+
+
+async def send_audio_frame(frame: av.AudioFrame):
+    """Send audio frame to processor if available."""
+    global sp
+    if not sp:
         return
-    await send_frame(frame)
+
+    try:
+        await sp.send_input_frame(AudioFrame.from_av_audio(frame))
+    except Exception as e:
+        logger.error(f"Error sending audio frame: {e}")
 
 
 # ------------------ Game Command Handling ------------------ #
@@ -81,7 +89,8 @@ async def connect_to_pixel_streaming():
 
     client = PixelStreamingClient(
         signaling_url, 
-        pixel_streaming_frame_callback, 
+        send_video_frame, 
+        audio_callback=send_audio_frame,
         max_fps=max_fps
     )
 
@@ -102,6 +111,12 @@ async def cleanup():
     logger.info("Starting cleanup...")
     shutdown_event.set()
 
+    # Stop frame delivery first so no frames are decoded or sent during shutdown
+    if client:
+        client.stop_receiving()
+
+    convert_executor.shutdown(wait=False, cancel_futures=True)
+
     # Cancel all background tasks
     for task in list(background_tasks):
         if not task.done():